@@ -1,9 +1,8 @@
 import streamlit as st
 import pandas as pd
-import requests
+import numpy as np
+from io import BytesIO
 from datetime import datetime
-import plotly.express as px
-import plotly.graph_objects as go
 
 # ---------------- App Configuration ----------------
 st.set_page_config(
@@ -13,6 +12,25 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+NAVIGATION_PAGES = (
+    "📊 Executive Dashboard",
+    "🥗 Nutrition & Diet",
+    "💉 Insulin & Medication",
+    "🏃 Activity Tracker",
+    "🍎 USDA Diet Planner",
+    "📈 Analytics & Reports",
+    "⚙️ Settings & Data"
+)
+ACTIVITY_TYPES = ("Walking", "Running", "Cycling", "Weightlifting", "Swimming", "Other")
+INTENSITY_LEVELS = ("Low", "Moderate", "High", "Maximum")
+DIETARY_GOALS = ("Balanced Glycemic", "Low-Carbohydrate", "High-Protein", "Ketogenic")
+PLOT_MAX_POINTS = 2000
+# Log timestamps are kept as datetime64 but shown and exported at minute resolution
+LOG_TIME_FORMAT = "%Y-%m-%d %H:%M"
+LOG_TIME_COLUMNS = {"time": st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm")}
+# Replace with actual USDA/Nutrition API endpoint in production
+DIET_API_URL = "http://localhost:8000/recommend"
+
 # ---------------- Backend: State Management ----------------
 def initialize_session_state():
     """Ensures a flawless backend by initializing all required data structures."""
@@ -23,6 +41,8 @@ def initialize_session_state():
         "activity_logs": [],
         "medication_logs": [],
         "uploads": [],
+        "frame_cache": {},
+        "export_cache": {},
         "settings": {
             "target_glucose": 100,
             "correction_factor": 50,
@@ -35,21 +55,194 @@ def initialize_session_state():
 
 initialize_session_state()
 
+# ---------------- Backend: Data Utilities ----------------
+def ensure_datetime(df, column):
+    """Returns the frame with a column as datetime64, converting (on a copy) only when it is not already typed as such."""
+    if not pd.api.types.is_datetime64_any_dtype(df[column]):
+        df = df.assign(**{column: pd.to_datetime(df[column], format="ISO8601", cache=True)})
+    return df
+
+@st.cache_data(max_entries=8, ttl=3600, show_spinner=False)
+def load_uploaded_csv(file_bytes):
+    """Parses an uploaded CSV once per distinct file; reruns are served from cache."""
+    try:
+        df = pd.read_csv(BytesIO(file_bytes), engine="pyarrow")
+        if df.columns.has_duplicates:
+            raise ValueError("duplicate column names")
+    except ValueError:
+        # pyarrow rejects some malformed/ragged files and keeps repeated headers as-is;
+        # the C parser tolerates the former and renames the latter (Notes, Notes.1)
+        df = pd.read_csv(BytesIO(file_bytes))
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        if col.dtype == "float64":
+            # keep float64 where float32 would round values (epoch seconds, IDs, coordinates)
+            narrow = col.astype("float32")
+            if np.array_equal(narrow.to_numpy("float64"), col.to_numpy(), equal_nan=True):
+                df.isetitem(i, narrow)
+        elif col.dtype == "int64":
+            df.isetitem(i, pd.to_numeric(col, downcast="integer"))
+        elif (col.dtype == object or isinstance(col.dtype, pd.StringDtype)) and col.nunique() < 0.5 * len(df):
+            df.isetitem(i, col.astype("category"))
+    return df
+
+def lttb_indices(x, y, n_out):
+    """Selects row positions via Largest-Triangle-Three-Buckets, preserving the visual shape of a series."""
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    anchor = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[stop:edges[i + 2]].mean()
+            next_y = y[stop:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        areas = np.abs(
+            (x[anchor] - next_x) * (y[start:stop] - y[anchor])
+            - (x[anchor] - x[start:stop]) * (next_y - y[anchor])
+        )
+        anchor = start + int(areas.argmax())
+        selected[i + 1] = anchor
+    return selected
+
+# ---------------- Backend: Clinical Calculations ----------------
+def calculate_bolus(current_bg, meal_carbs, target_bg, cf, cr):
+    """Returns the (correction, meal, total) bolus in units for a reading and meal."""
+    correction_dose = max(0, (current_bg - target_bg) / cf)
+    meal_dose = meal_carbs / cr if cr > 0 else 0
+    total_dose = round(correction_dose + meal_dose, 2)
+    return correction_dose, meal_dose, total_dose
+
+# ---------------- Backend: External Services ----------------
+def get_http_session():
+    """Provides a pooled HTTP session per browser session so repeat API calls reuse open connections."""
+    # requests.Session is not thread-safe, so it is not shared across script threads
+    if "http_session" not in st.session_state:
+        import requests
+        st.session_state.http_session = requests.Session()
+    return st.session_state.http_session
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def fetch_diet_plan(goal, days):
+    """Requests a meal plan from the nutrition API; repeat queries within the hour hit the cache."""
+    import requests
+    response = get_http_session().post(DIET_API_URL, json={"goal": goal, "days": days}, timeout=5)
+    if response.status_code != 200:
+        raise requests.exceptions.HTTPError(response=response)
+    return response.json()
+
+# ---------------- Backend: Session Logs ----------------
+def append_log(key, **fields):
+    """Appends a record stamped with the current minute to a session log."""
+    st.session_state[key].append({"time": pd.Timestamp.now().floor("min"), **fields})
+
+def log_frame(key):
+    """Returns a session log as a DataFrame, rebuilding only after new records have been appended."""
+    logs = st.session_state[key]
+    cached = st.session_state.frame_cache.get(key)
+    if cached is None or cached[0] != len(logs):
+        cached = (len(logs), pd.DataFrame(logs))
+        st.session_state.frame_cache[key] = cached
+    return cached[1]
+
+def export_log(key):
+    """Serializes a session log to CSV bytes, rebuilding only after new records have been appended."""
+    logs = st.session_state[key]
+    cached = st.session_state.export_cache.get(key)
+    if cached is None or cached[0] != len(logs):
+        cached = (len(logs), log_frame(key).to_csv(index=False, date_format=LOG_TIME_FORMAT).encode('utf-8'))
+        st.session_state.export_cache[key] = cached
+    return cached[1]
+
+# ---------------- Backend: Chart Builders ----------------
+@st.cache_data(show_spinner=False)
+def build_glucose_figure(df_bg, target_glucose):
+    """Builds the glucose trajectory chart; unchanged readings and target reuse the cached figure."""
+    import plotly.express as px
+    fig = px.scatter(
+        df_bg, x="time", y="glucose", 
+        color="glucose", 
+        color_continuous_scale=[(0, "blue"), (0.5, "green"), (1, "red")],
+        range_color=[50, 250],
+        size_max=10, 
+        render_mode="webgl",
+        title="Continuous Blood Glucose Mapping"
+    )
+    fig.add_hline(y=target_glucose, line_dash="dash", line_color="green", annotation_text="Target")
+    fig.update_traces(mode='lines+markers')
+    return fig
+
+@st.cache_data(show_spinner=False)
+def build_macro_figure(carbs, protein, fat):
+    """Builds the macronutrient donut chart; identical totals reuse the cached figure."""
+    import plotly.express as px
+    return px.pie(
+        values=[carbs, protein, fat], 
+        names=["carbs", "protein", "fat"], 
+        title="Aggregate Macronutrient Ratio",
+        hole=0.4
+    )
+
+# ---------------- Frontend: Fragments ----------------
+@st.fragment
+def bolus_calculator():
+    """Renders the bolus calculator; submitting it reruns only this fragment, not the whole app."""
+    st.subheader("Bolus Calculator")
+    st.markdown("Utilizes clinical calculation methodologies based on your personal parameters.")
+    
+    with st.form("insulin_form"):
+        current_bg = st.number_input("Current Glucose (mg/dL)", min_value=20, max_value=600, value=120)
+        meal_carbs = st.number_input("Meal Carbohydrates (g)", min_value=0, value=0)
+        
+        submitted = st.form_submit_button("Calculate & Log Dose")
+        
+        if submitted:
+            settings = st.session_state.settings
+            correction_dose, meal_dose, total_dose = calculate_bolus(
+                current_bg, meal_carbs,
+                settings["target_glucose"], settings["correction_factor"], settings["carb_ratio"]
+            )
+            
+            append_log(
+                "insulin_logs",
+                glucose=current_bg,
+                carbs=meal_carbs,
+                dose=total_dose,
+                type="Bolus"
+            )
+            
+            st.success(f"Calculated Recommended Dose: **{total_dose} Units**")
+            st.info(f"Correction: {correction_dose:.2f}U | Meal: {meal_dose:.2f}U")
+
+@st.fragment
+def medication_log():
+    """Renders the medication form and history; logging a dose reruns only this fragment."""
+    st.subheader("Medication Log")
+    with st.form("med_form", clear_on_submit=True):
+        med_name = st.text_input("Medication Name (e.g., Metformin, Basal Insulin)")
+        dosage = st.text_input("Dosage (e.g., 500mg, 15U)")
+        if st.form_submit_button("Log Medication"):
+            append_log(
+                "medication_logs",
+                medication=med_name,
+                dosage=dosage
+            )
+            st.success("Medication recorded.")
+            
+    if st.session_state.medication_logs:
+        st.dataframe(log_frame("medication_logs"), use_container_width=True, column_config=LOG_TIME_COLUMNS)
+
 # ---------------- Navigation & UI Setup ----------------
 st.sidebar.title("💉 MySugr Advanced")
 st.sidebar.markdown("---")
-navigation = st.sidebar.radio(
-    "Navigation System",
-    [
-        "📊 Executive Dashboard", 
-        "🥗 Nutrition & Diet", 
-        "💉 Insulin & Medication", 
-        "🏃 Activity Tracker",
-        "🍎 USDA Diet Planner", 
-        "📈 Analytics & Reports",
-        "⚙️ Settings & Data"
-    ]
-)
+navigation = st.sidebar.radio("Navigation System", NAVIGATION_PAGES)
 st.sidebar.markdown("---")
 st.sidebar.info("Application operates in local mode. All data is stored in the current session.")
 
@@ -82,8 +275,13 @@ if navigation == "📊 Executive Dashboard":
         # Display latest 5 glucose readings
         if st.session_state.insulin_logs:
             st.write("**Latest Glucose Readings**")
-            df_recent_bg = pd.DataFrame(st.session_state.insulin_logs).tail(5)[["time", "glucose", "dose"]]
-            st.dataframe(df_recent_bg, use_container_width=True)
+            n_logs = len(st.session_state.insulin_logs)
+            df_recent_bg = pd.DataFrame(
+                st.session_state.insulin_logs[-5:],
+                columns=["time", "glucose", "dose"],
+                index=range(max(0, n_logs - 5), n_logs)
+            )
+            st.dataframe(df_recent_bg, use_container_width=True, column_config=LOG_TIME_COLUMNS)
 
 # ---------------- Module 2: Nutrition & Diet ----------------
 elif navigation == "🥗 Nutrition & Diet":
@@ -101,21 +299,21 @@ elif navigation == "🥗 Nutrition & Diet":
             fat = st.number_input("Fat (g)", min_value=0.0, step=5.0)
             
             if st.form_submit_button("Submit Meal Data"):
-                st.session_state.diet_tracking.append({
-                    "time": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                    "meal": meal_name,
-                    "calories": calories,
-                    "carbs": carbs,
-                    "protein": protein,
-                    "fat": fat
-                })
+                append_log(
+                    "diet_tracking",
+                    meal=meal_name,
+                    calories=calories,
+                    carbs=carbs,
+                    protein=protein,
+                    fat=fat
+                )
                 st.success("Meal successfully recorded.")
 
     with col2:
         st.subheader("Dietary Ledger")
         if st.session_state.diet_tracking:
-            df_meals = pd.DataFrame(st.session_state.diet_tracking)
-            st.dataframe(df_meals, use_container_width=True)
+            df_meals = log_frame("diet_tracking")
+            st.dataframe(df_meals, use_container_width=True, column_config=LOG_TIME_COLUMNS)
         else:
             st.write("No meals tracked currently.")
 
@@ -126,50 +324,10 @@ elif navigation == "💉 Insulin & Medication":
     col1, col2 = st.columns(2)
     
     with col1:
-        st.subheader("Bolus Calculator")
-        st.markdown("Utilizes clinical calculation methodologies based on your personal parameters.")
-        
-        with st.form("insulin_form"):
-            current_bg = st.number_input("Current Glucose (mg/dL)", min_value=20, max_value=600, value=120)
-            meal_carbs = st.number_input("Meal Carbohydrates (g)", min_value=0, value=0)
-            
-            submitted = st.form_submit_button("Calculate & Log Dose")
-            
-            if submitted:
-                target_bg = st.session_state.settings["target_glucose"]
-                cf = st.session_state.settings["correction_factor"]
-                cr = st.session_state.settings["carb_ratio"]
-                
-                correction_dose = max(0, (current_bg - target_bg) / cf)
-                meal_dose = meal_carbs / cr if cr > 0 else 0
-                total_dose = round(correction_dose + meal_dose, 2)
-                
-                st.session_state.insulin_logs.append({
-                    "time": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                    "glucose": current_bg,
-                    "carbs": meal_carbs,
-                    "dose": total_dose,
-                    "type": "Bolus"
-                })
-                
-                st.success(f"Calculated Recommended Dose: **{total_dose} Units**")
-                st.info(f"Correction: {correction_dose:.2f}U | Meal: {meal_dose:.2f}U")
+        bolus_calculator()
 
     with col2:
-        st.subheader("Medication Log")
-        with st.form("med_form", clear_on_submit=True):
-            med_name = st.text_input("Medication Name (e.g., Metformin, Basal Insulin)")
-            dosage = st.text_input("Dosage (e.g., 500mg, 15U)")
-            if st.form_submit_button("Log Medication"):
-                st.session_state.medication_logs.append({
-                    "time": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                    "medication": med_name,
-                    "dosage": dosage
-                })
-                st.success("Medication recorded.")
-                
-        if st.session_state.medication_logs:
-            st.dataframe(pd.DataFrame(st.session_state.medication_logs), use_container_width=True)
+        medication_log()
 
 # ---------------- Module 4: Activity Tracker ----------------
 elif navigation == "🏃 Activity Tracker":
@@ -179,25 +337,25 @@ elif navigation == "🏃 Activity Tracker":
     with st.form("activity_form", clear_on_submit=True):
         col1, col2 = st.columns(2)
         with col1:
-            activity_type = st.selectbox("Activity Type", ["Walking", "Running", "Cycling", "Weightlifting", "Swimming", "Other"])
+            activity_type = st.selectbox("Activity Type", ACTIVITY_TYPES)
             duration = st.number_input("Duration (minutes)", min_value=1, step=5)
         with col2:
-            intensity = st.select_slider("Intensity Level", options=["Low", "Moderate", "High", "Maximum"])
+            intensity = st.select_slider("Intensity Level", options=INTENSITY_LEVELS)
             notes = st.text_input("Additional Notes")
             
         if st.form_submit_button("Log Activity"):
-            st.session_state.activity_logs.append({
-                "time": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                "activity": activity_type,
-                "duration": duration,
-                "intensity": intensity,
-                "notes": notes
-            })
+            append_log(
+                "activity_logs",
+                activity=activity_type,
+                duration=duration,
+                intensity=intensity,
+                notes=notes
+            )
             st.success("Activity recorded successfully.")
             
     if st.session_state.activity_logs:
         st.subheader("Activity History")
-        st.dataframe(pd.DataFrame(st.session_state.activity_logs), use_container_width=True)
+        st.dataframe(log_frame("activity_logs"), use_container_width=True, column_config=LOG_TIME_COLUMNS)
 
 # ---------------- Module 5: USDA Diet Planner ----------------
 elif navigation == "🍎 USDA Diet Planner":
@@ -207,33 +365,29 @@ elif navigation == "🍎 USDA Diet Planner":
     with st.container():
         col1, col2 = st.columns(2)
         with col1:
-            diet_choice = st.selectbox("Primary Dietary Goal", ["Balanced Glycemic", "Low-Carbohydrate", "High-Protein", "Ketogenic"])
+            diet_choice = st.selectbox("Primary Dietary Goal", DIETARY_GOALS)
         with col2:
             days = st.slider("Duration (Days)", 1, 14, 7)
             
+        st.caption("Plans are cached for one hour per goal and duration; repeat queries return the same plan.")
         if st.button("Query USDA Database", use_container_width=True):
+            import requests
             with st.spinner("Establishing connection and retrieving protocols..."):
                 try:
-                    # Replace with actual USDA/Nutrition API endpoint in production
-                    api_url = "http://localhost:8000/recommend" 
-                    payload = {"goal": diet_choice, "days": days}
-                    response = requests.post(api_url, json=payload, timeout=5)
-                    
-                    if response.status_code == 200:
-                        rec_data = response.json()
-                        if "plan" in rec_data:
-                            df = pd.DataFrame(rec_data["plan"])
-                            st.session_state.diet_recommendations.append({
-                                "time": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                                "goal": diet_choice,
-                                "plan": rec_data["plan"]
-                            })
-                            st.success("Protocol retrieved successfully.")
-                            st.dataframe(df, use_container_width=True)
-                        else:
-                            st.error("Malformed payload received from API.")
+                    rec_data = fetch_diet_plan(diet_choice, days)
+                    if "plan" in rec_data:
+                        df = pd.DataFrame(rec_data["plan"])
+                        append_log(
+                            "diet_recommendations",
+                            goal=diet_choice,
+                            plan=rec_data["plan"]
+                        )
+                        st.success("Protocol retrieved successfully.")
+                        st.dataframe(df, use_container_width=True)
                     else:
-                        st.error(f"API Error {response.status_code}: {response.text}")
+                        st.error("Malformed payload received from API.")
+                except requests.exceptions.HTTPError as e:
+                    st.error(f"API Error {e.response.status_code}: {e.response.text}")
                 except requests.exceptions.RequestException:
                     st.warning("⚠️ API connection failed. Simulating fallback data for demonstration purposes.")
                     # Fallback data for testing UI without a running backend
@@ -249,39 +403,27 @@ elif navigation == "📈 Analytics & Reports":
     
     with tab1:
         if st.session_state.insulin_logs:
-            df_bg = pd.DataFrame(st.session_state.insulin_logs)
-            df_bg['time'] = pd.to_datetime(df_bg['time'])
+            df_bg = log_frame("insulin_logs")
+            df_bg = ensure_datetime(df_bg, "time")
+            if not df_bg["time"].is_monotonic_increasing:
+                df_bg = df_bg.sort_values("time", ignore_index=True)
+            df_bg = df_bg.iloc[lttb_indices(df_bg["time"].astype("int64"), df_bg["glucose"], PLOT_MAX_POINTS)]
             
             st.subheader("Glucose Level Trajectory")
             
-            # Advanced Plotly Chart
-            fig = px.scatter(
-                df_bg, x="time", y="glucose", 
-                color="glucose", 
-                color_continuous_scale=[(0, "blue"), (0.5, "green"), (1, "red")],
-                range_color=[50, 250],
-                size_max=10, 
-                title="Continuous Blood Glucose Mapping"
-            )
-            fig.add_hline(y=st.session_state.settings["target_glucose"], line_dash="dash", line_color="green", annotation_text="Target")
-            fig.update_traces(mode='lines+markers')
+            fig = build_glucose_figure(df_bg[["time", "glucose"]], st.session_state.settings["target_glucose"])
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("Insufficient glycemic data for analysis.")
             
     with tab2:
         if st.session_state.diet_tracking:
-            df_diet = pd.DataFrame(st.session_state.diet_tracking)
+            df_diet = log_frame("diet_tracking")
             st.subheader("Macronutrient Distribution")
             
             if 'carbs' in df_diet.columns and 'protein' in df_diet.columns and 'fat' in df_diet.columns:
                 totals = df_diet[['carbs', 'protein', 'fat']].sum()
-                fig_pie = px.pie(
-                    values=totals.values, 
-                    names=totals.index, 
-                    title="Aggregate Macronutrient Ratio",
-                    hole=0.4
-                )
+                fig_pie = build_macro_figure(float(totals["carbs"]), float(totals["protein"]), float(totals["fat"]))
                 st.plotly_chart(fig_pie, use_container_width=True)
             else:
                 st.bar_chart(df_diet["calories"])
@@ -315,14 +457,19 @@ elif navigation == "⚙️ Settings & Data":
         
         uploaded_file = st.file_uploader("Upload External CSV", type=["csv"])
         if uploaded_file:
-            df_upload = pd.read_csv(uploaded_file)
-            st.session_state.uploads.append({"filename": uploaded_file.name, "data": df_upload.to_dict()})
+            df_upload = load_uploaded_csv(uploaded_file.getvalue())
+            if not any(u["file_id"] == uploaded_file.file_id for u in st.session_state.uploads):
+                st.session_state.uploads.append({
+                    "filename": uploaded_file.name,
+                    "file_id": uploaded_file.file_id,
+                    "data": df_upload
+                })
             st.success("Data ingested successfully.")
             st.dataframe(df_upload.head(3))
             
         st.markdown("---")
         if st.session_state.insulin_logs:
-            csv_export = pd.DataFrame(st.session_state.insulin_logs).to_csv(index=False).encode('utf-8')
+            csv_export = export_log("insulin_logs")
             st.download_button(
                 label="📥 Export Insulin Logs (CSV)",
                 data=csv_export,